@@ -1,49 +1,177 @@
 import fitz  # PyMuPDF
 import pdfplumber
+import hashlib
+import io
+import json
 import os
+import re
+import shutil
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from tqdm import tqdm
 
-def extract_text_and_tables_from_pdf(pdf_path):
-    """Extract text and tables from a PDF file"""
-    results = {
-        'text_content': [],
-        'table_content': []
-    }
-    
-    # Extract text using PyMuPDF (faster)
+# Collapses runs of whitespace in C without materializing a word list
+_WS_RE = re.compile(r'\s+')
+
+def extract_text_with_fitz(pdf_bytes):
+    """Extract per-page text lines using PyMuPDF (faster)"""
+    text_content = []
     try:
-        pdf_document = fitz.open(pdf_path)
+        pdf_document = fitz.open(stream=pdf_bytes, filetype='pdf')
         for page_num in range(len(pdf_document)):
             page = pdf_document[page_num]
             text = page.get_text()
             # Replace newlines with spaces and clean up extra spaces
-            text_single_line = ' '.join(text.split())
-            if text_single_line.strip():
-                results['text_content'].append(f"[Page {page_num + 1}] {text_single_line}")
+            text_single_line = _WS_RE.sub(' ', text).strip()
+            if text_single_line:
+                text_content.append(f"[Page {page_num + 1}] {text_single_line}")
         pdf_document.close()
     except Exception as e:
-        results['text_content'].append(f"[Error extracting text] {str(e)}")
-    
-    # Extract tables using pdfplumber
+        text_content.append(f"[Error extracting text] {str(e)}")
+    return text_content
+
+def extract_tables_with_pdfplumber(pdf_bytes):
+    """Extract table lines using pdfplumber"""
+    table_content = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
             for page_num, page in enumerate(pdf.pages):
+                # Table detection runs expensive edge analysis; the default
+                # "lines" strategy builds edges from lines, rectangles and
+                # curves, so only skip pages that have none of the three
+                if not page.lines and not page.rects and not page.curves:
+                    continue
                 tables = page.extract_tables()
                 for table_num, table in enumerate(tables):
                     if table:
-                        # Convert table to string format
-                        table_str = f"[Table {table_num + 1} on Page {page_num + 1}] "
+                        # Convert table to string format - collect row strings
+                        # and join once instead of growing a string with +=
+                        row_strs = []
                         for row in table:
                             if row:
                                 # Join cells with spaces, handle None values
-                                row_str = " ".join([str(cell) if cell is not None else "" for cell in row])
-                                table_str += row_str + " | "
-                        results['table_content'].append(table_str.rstrip(" | "))
+                                row_strs.append(" ".join([str(cell) if cell is not None else "" for cell in row]))
+                        table_str = f"[Table {table_num + 1} on Page {page_num + 1}] " + " | ".join(row_strs)
+                        table_content.append(table_str.rstrip(" | "))
     except Exception as e:
-        results['table_content'].append(f"[Error extracting tables] {str(e)}")
-    
+        table_content.append(f"[Error extracting tables] {str(e)}")
+    return table_content
+
+def extract_text_and_tables_from_pdf(pdf_path):
+    """Extract text and tables from a PDF file"""
+    # Read the file once and hand the same bytes to both libraries -
+    # previously each extractor opened and read the PDF independently
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+
+    # Bail out early on password-protected PDFs: if fitz can't unlock the
+    # file with an empty password, pdfplumber won't fare any better, so
+    # don't pay for two failing extraction passes
+    if b'/Encrypt' in pdf_bytes[-2048:]:
+        try:
+            probe = fitz.open(stream=pdf_bytes, filetype='pdf')
+            locked = probe.needs_pass and not probe.authenticate('')
+            probe.close()
+        except Exception:
+            locked = True
+        if locked:
+            return {
+                'text_content': ["[Error extracting text] PDF is encrypted and requires a password"],
+                'table_content': ["[Error extracting tables] PDF is encrypted and requires a password"]
+            }
+
+    # Run both extractors at the same time. Only PyMuPDF parses in C and
+    # releases the GIL; pdfplumber (pdfminer.six) is pure Python, so the
+    # fitz pass overlaps with it but the overlap is partial, not a full
+    # max(text pass, table pass)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        text_future = executor.submit(extract_text_with_fitz, pdf_bytes)
+        table_future = executor.submit(extract_tables_with_pdfplumber, pdf_bytes)
+        results = {
+            'text_content': text_future.result(),
+            'table_content': table_future.result()
+        }
+
     return results
 
+def pdf_fingerprint(pdf_path):
+    """Cheap fingerprint: first 1MB of content, file size and basename.
+
+    The basename is included because the cached payload embeds a
+    'FILE: <name>' header - a renamed copy of the same bytes must not
+    reuse a cached .txt naming the original file."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(pdf_path, 'rb') as f:
+        hasher.update(f.read(1 << 20))
+    hasher.update(str(os.path.getsize(pdf_path)).encode())
+    hasher.update(os.path.basename(pdf_path).encode())
+    return hasher.hexdigest()
+
+def process_single_pdf(pdf_path, output_path):
+    """Extract one PDF and write its text file (runs in a worker process)"""
+    pdf_file = os.path.basename(pdf_path)
+
+    # Reuse a previous run's extraction if this exact PDF was seen before -
+    # extraction dominates runtime, a cached result is just a file copy
+    cache_dir = os.path.join(os.path.dirname(output_path), '.cache')
+    cache_path = os.path.join(cache_dir, pdf_fingerprint(pdf_path) + '.txt')
+    if os.path.exists(cache_path):
+        shutil.copyfile(cache_path, output_path)
+        return output_path
+
+    # Extract content
+    content = extract_text_and_tables_from_pdf(pdf_path)
+
+    # Build the whole payload in memory, then write it with one syscall -
+    # dozens of small write() calls per file add up over large folders
+    parts = []
+    parts.append("=" * 80 + "\n")
+    parts.append(f"FILE: {pdf_file}\n")
+    parts.append("=" * 80 + "\n\n")
+
+    # Text content
+    parts.append("--- TEXT CONTENT ---\n")
+    if content['text_content']:
+        for text_line in content['text_content']:
+            parts.append(text_line + "\n")
+    else:
+        parts.append("[No text content found]\n")
+
+    parts.append("\n--- TABLE CONTENT ---\n")
+    if content['table_content']:
+        for table_line in content['table_content']:
+            parts.append(table_line + "\n")
+    else:
+        parts.append("[No tables found]\n")
+
+    parts.append("\n")
+
+    payload = "".join(parts).encode('utf-8')
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+    finally:
+        os.close(fd)
+
+    # Save a cache copy so future runs over the same PDF skip extraction.
+    # Only successful extractions are memoized: the extractors fold any
+    # exception into "[Error extracting ...]" lines, and a transient
+    # failure (e.g. MemoryError under full parallel load) must be retried
+    # on the next run, not served from cache forever.
+    # Write to a per-worker temp name and publish with an atomic rename -
+    # a worker killed mid-write must never leave a truncated entry that
+    # every later run would blindly copy to the real output
+    had_errors = any(line.startswith('[Error extracting')
+                     for line in content['text_content'] + content['table_content'])
+    if not had_errors:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as cache_file:
+            cache_file.write(payload)
+        os.replace(tmp_path, cache_path)
+
+    return output_path
+
 def main():
     # ===== CONFIGURATION VARIABLES =====
     # Change these paths as needed:
@@ -60,8 +188,10 @@ def main():
         print(f"Error: PDF source folder '{pdf_source_folder}' not found!")
         return
     
-    # Get all PDF files
-    pdf_files = [f for f in os.listdir(pdf_source_folder) if f.lower().endswith('.pdf')]
+    # Get all PDF files - scandir yields entries with the file type cached
+    # from the directory read, so no extra stat per entry
+    pdf_files = [entry.name for entry in os.scandir(pdf_source_folder)
+                 if entry.is_file() and entry.name.lower().endswith('.pdf')]
     
     if not pdf_files:
         print(f"No PDF files found in '{pdf_source_folder}' folder!")
@@ -72,46 +202,57 @@ def main():
     print(f"Export folder: {export_destination_folder}")
     print()
     
-    # Process each PDF and create individual text files
-    for pdf_file in sorted(pdf_files):
-        pdf_path = os.path.join(pdf_source_folder, pdf_file)
-        print(f"Processing: {pdf_file}")
-        
-        # Create output filename (same as PDF but with .txt extension)
-        output_filename = os.path.splitext(pdf_file)[0] + ".txt"
-        output_path = os.path.join(export_destination_folder, output_filename)
-        
-        # Extract content
-        content = extract_text_and_tables_from_pdf(pdf_path)
-        
-        # Write to individual file in export folder
-        with open(output_path, 'w', encoding='utf-8') as output:
-            output.write("=" * 80 + "\n")
-            output.write(f"FILE: {pdf_file}\n")
-            output.write("=" * 80 + "\n\n")
-            
-            # Write text content
-            output.write("--- TEXT CONTENT ---\n")
-            if content['text_content']:
-                for text_line in content['text_content']:
-                    output.write(text_line + "\n")
-            else:
-                output.write("[No text content found]\n")
-            
-            output.write("\n--- TABLE CONTENT ---\n")
-            if content['table_content']:
-                for table_line in content['table_content']:
-                    output.write(table_line + "\n")
+    # Optional combined mode: one append-only .jsonl instead of thousands
+    # of tiny .txt files (directory entry + inode per file adds up)
+    combined_mode = bool(os.environ.get('PDF_EXPORT_COMBINED'))
+    combined_path = os.path.join(export_destination_folder, "combined_extractions.jsonl")
+
+    # Process PDFs in parallel - each file is independent, so fan out
+    # across processes to use all cores (extraction is CPU-bound)
+    max_workers = min(os.cpu_count() or 1, 8)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for pdf_file in sorted(pdf_files):
+            pdf_path = os.path.join(pdf_source_folder, pdf_file)
+
+            if combined_mode:
+                # Workers only extract; the main process owns the single
+                # output file so no cross-process write coordination needed
+                futures[executor.submit(extract_text_and_tables_from_pdf, pdf_path)] = pdf_file
             else:
-                output.write("[No tables found]\n")
-            
-            output.write("\n")
-        
-        print(f"  → Created: {output_path}")
-    
-    print(f"\nExtraction complete! Created {len(pdf_files)} individual text files.")
-    print(f"All text files saved in: {export_destination_folder}")
-    print("Each text file has the same name as its corresponding PDF.")
+                # Create output filename (same as PDF but with .txt extension)
+                output_filename = os.path.splitext(pdf_file)[0] + ".txt"
+                output_path = os.path.join(export_destination_folder, output_filename)
+
+                futures[executor.submit(process_single_pdf, pdf_path, output_path)] = pdf_file
+
+        combined_output = open(combined_path, 'w', encoding='utf-8') if combined_mode else None
+
+        # One progress bar for the whole batch instead of a few prints per
+        # file - thousands of stdout flushes get measurable in tight loops
+        for future in tqdm(as_completed(futures), total=len(futures), unit='pdf'):
+            pdf_file = futures[future]
+            try:
+                result = future.result()
+                if combined_output is not None:
+                    record = {
+                        'file': pdf_file,
+                        'text_content': result['text_content'],
+                        'table_content': result['table_content']
+                    }
+                    combined_output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except Exception as e:
+                tqdm.write(f"Error processing {pdf_file}: {e}")
+
+        if combined_output is not None:
+            combined_output.close()
+
+    if combined_mode:
+        print(f"\nExtraction complete! Wrote {len(pdf_files)} records to: {combined_path}")
+    else:
+        print(f"\nExtraction complete! Created {len(pdf_files)} individual text files.")
+        print(f"All text files saved in: {export_destination_folder}")
+        print("Each text file has the same name as its corresponding PDF.")
 
 if __name__ == "__main__":
     main()
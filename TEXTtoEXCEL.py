@@ -1,8 +1,18 @@
+import functools
+import hashlib
+import itertools
 import json
 import os
 import re
-import pandas as pd
-from pathlib import Path
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+# Compiled rule set and cache location for this process; populated by
+# init_worker in pool workers
+_worker_rules = None
+_worker_cache_dir = None
 
 def load_config(config_file):
     """Load extraction configuration from JSON file"""
@@ -33,68 +43,175 @@ def get_value_pattern(value_type):
     }
     return patterns.get(value_type, r'.+?')  # Default to any character if type not recognized
 
-def extract_value_with_anchors(text, subrule, flags):
-    """Strictly extract using exact before/after anchors. No fuzzy fallbacks."""
-    before_text = subrule.get('before_text', '')
-    after_text = subrule.get('after_text', '')
-    value_type = subrule.get('value_type', 'both')
+@functools.lru_cache(maxsize=256)
+def compile_anchor_patterns(before_text, after_text, value_type, flags):
+    """Build the compiled pattern chain for one anchor combination (cached).
+
+    Patterns are returned in match-priority order: both anchors, then
+    before-only (strict end-of-line first, whitespace boundary fallback),
+    then after-only. The cache means each distinct subrule compiles once
+    per run instead of once per file."""
     value_pattern = get_value_pattern(value_type)
+    patterns = []
 
     # Exact match with both anchors
     if before_text and after_text:
-        pattern = re.escape(before_text) + '(' + value_pattern + ')' + re.escape(after_text)
-        match = re.search(pattern, text, flags)
-        if match:
-            return match.group(1).strip()
+        patterns.append(re.compile(
+            re.escape(before_text) + '(' + value_pattern + ')' + re.escape(after_text), flags))
 
     # Exact match with only before_text
     if before_text and not after_text:
-        # First, try strict end-of-line or end-of-string boundary
-        pattern_eol = re.escape(before_text) + '(' + value_pattern + ')(?:\r?\n|$)'
-        match = re.search(pattern_eol, text, flags)
-        if match:
-            return match.group(1).strip()
-
+        # First, strict end-of-line or end-of-string boundary
+        patterns.append(re.compile(
+            re.escape(before_text) + '(' + value_pattern + ')(?:\r?\n|$)', flags))
         # Fallback: allow whitespace boundary (still exact before_text anchor)
-        pattern_ws = re.escape(before_text) + '(' + value_pattern + ')(?:\s|$|\n)'
-        match = re.search(pattern_ws, text, flags)
-        if match:
-            return match.group(1).strip()
+        patterns.append(re.compile(
+            re.escape(before_text) + '(' + value_pattern + ')(?:\s|$|\n)', flags))
 
     # Exact match with only after_text
     if after_text and not before_text:
-        pattern = '(' + value_pattern + ')' + re.escape(after_text)
-        match = re.search(pattern, text, flags)
+        patterns.append(re.compile(
+            '(' + value_pattern + ')' + re.escape(after_text), flags))
+
+    return tuple(patterns)
+
+def extract_value_with_anchors(text, subrule, flags):
+    """Strictly extract using exact before/after anchors. No fuzzy fallbacks."""
+    patterns = compile_anchor_patterns(
+        subrule.get('before_text', ''),
+        subrule.get('after_text', ''),
+        subrule.get('value_type', 'both'),
+        flags
+    )
+    for pattern in patterns:
+        match = pattern.search(text)
         if match:
             return match.group(1).strip()
 
     return None
 
-def extract_value_strict(text, rule):
-    """Extract value using strict anchors and else-if alternatives."""
-    try:
-        case_sensitive = rule.get('case_sensitive', False)
-        flags = 0 if case_sensitive else re.IGNORECASE
+def compile_rule(rule):
+    """Pre-resolve one rule's name, flags and pattern chain (primary + else-if).
+
+    Doing this once per rule before the file loop means the per-file work
+    is just pattern.search calls - no dict walking or flag resolution."""
+    case_sensitive = rule.get('case_sensitive', False)
+    flags = 0 if case_sensitive else re.IGNORECASE
 
-        # Primary rule
-        primary = extract_value_with_anchors(text, rule, flags)
-        if primary:
-            return primary
+    chain = [compile_anchor_patterns(
+        rule.get('before_text', ''),
+        rule.get('after_text', ''),
+        rule.get('value_type', 'both'),
+        flags
+    )]
+    for alt in rule.get('else_if', []) or []:
+        alt_case = alt.get('case_sensitive', case_sensitive)
+        alt_flags = 0 if alt_case else re.IGNORECASE
+        chain.append(compile_anchor_patterns(
+            alt.get('before_text', ''),
+            alt.get('after_text', ''),
+            alt.get('value_type', 'both'),
+            alt_flags
+        ))
+
+    return {
+        # Interned so every result row holds the same string object
+        # rather than per-row copies surviving pickling boundaries
+        'name': sys.intern(rule.get('name', 'unknown')),
+        'chain': chain,
+        # Optional bounded window: only search the first search_limit
+        # characters (or the last ones with search_from_end for footers)
+        'search_limit': rule.get('search_limit'),
+        'search_from_end': rule.get('search_from_end', False)
+    }
 
-        # Else-if chain
-        for alt in rule.get('else_if', []) or []:
-            alt_case = alt.get('case_sensitive', case_sensitive)
-            alt_flags = 0 if alt_case else re.IGNORECASE
-            found = extract_value_with_anchors(text, alt, alt_flags)
+def extract_value_compiled(text, compiled_rule):
+    """Extract value using a rule prepared by compile_rule."""
+    try:
+        # Header/footer fields don't need a whole-file scan; honor the
+        # rule's bounded window when one is configured
+        search_limit = compiled_rule['search_limit']
+        if search_limit:
+            text = text[-search_limit:] if compiled_rule['search_from_end'] else text[:search_limit]
+
+        for patterns in compiled_rule['chain']:
+            # First matching pattern decides this subrule; move on to the
+            # next else-if alternative only when it yielded nothing
+            found = None
+            for pattern in patterns:
+                match = pattern.search(text)
+                if match:
+                    found = match.group(1).strip()
+                    break
             if found:
                 return found
 
         return None
 
     except Exception as e:
-        print(f"Error extracting value with rule {rule.get('name', 'unknown')}: {e}")
+        print(f"Error extracting value with rule {compiled_rule.get('name', 'unknown')}: {e}")
         return None
 
+def extract_value_strict(text, rule):
+    """Extract value using strict anchors and else-if alternatives."""
+    return extract_value_compiled(text, compile_rule(rule))
+
+def init_worker(extraction_rules):
+    """Compile the rule set once per worker process"""
+    global _worker_rules, _worker_cache_dir
+    _worker_rules = [compile_rule(rule) for rule in extraction_rules]
+
+    # The cache directory is keyed by the rule set, so editing the config
+    # automatically invalidates every cached result
+    rules_hash = hashlib.blake2b(
+        json.dumps(extraction_rules, sort_keys=True).encode('utf-8'),
+        digest_size=16
+    ).hexdigest()
+    _worker_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'pdf_export', rules_hash)
+
+def process_single_text_file(file_path):
+    """Apply every compiled rule to one text file (runs in a worker process)"""
+    filename = os.path.splitext(os.path.basename(file_path))[0]  # Filename without extension
+    rows = []
+
+    # Read the text file
+    try:
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+        text_content = raw_bytes.decode('utf-8')
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        return rows
+
+    # Re-runs over unchanged files are common while iterating on a config;
+    # serve those straight from the per-(content, rule set) disk cache
+    hasher = hashlib.blake2b(raw_bytes, digest_size=16)
+    hasher.update(filename.encode('utf-8'))
+    cache_path = os.path.join(_worker_cache_dir, hasher.hexdigest() + '.json')
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return [tuple(row) for row in json.load(f)]
+        except Exception:
+            pass  # unreadable cache entry - fall through and recompute
+
+    # Apply each extraction rule - always add a result, successful or not.
+    # Rows are plain (Filename, Config_Name, Extracted_Value) tuples; no
+    # per-row dict allocation or key hashing on the hot path. Misses stay
+    # None here; the default is filled in one pass by process_text_files
+    for rule in _worker_rules:
+        rows.append((filename, rule['name'], extract_value_compiled(text_content, rule)))
+
+    # Caching is best-effort; extraction results still return on failure
+    try:
+        os.makedirs(_worker_cache_dir, exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f)
+    except Exception:
+        pass
+
+    return rows
+
 def extract_value(text, rule):
     """Extract value from text using the specified rule"""
     try:
@@ -122,8 +239,9 @@ def extract_value(text, rule):
             match = re.search(pattern, text, flags)
             if match:
                 extracted = match.group(1).strip()
-                # Clean up common trailing characters
-                extracted = re.sub(r'[,.\s]+$', '', extracted)
+                # Clean up common trailing characters (rstrip runs in C,
+                # no regex engine needed for a fixed trailing set)
+                extracted = extracted.rstrip(',. \t\r\n\x0b\x0c')
                 return extracted
         
         # Method 3: Use only value_type pattern to search entire document
@@ -148,8 +266,9 @@ def extract_value(text, rule):
             match = re.search(pattern, text, flags)
             if match:
                 extracted = match.group(1).strip()
-                # Clean up common trailing characters
-                extracted = re.sub(r'[,.\s]+$', '', extracted)
+                # Clean up common trailing characters (rstrip runs in C,
+                # no regex engine needed for a fixed trailing set)
+                extracted = extracted.rstrip(',. \t\r\n\x0b\x0c')
                 return extracted
         
         return None
@@ -163,52 +282,101 @@ def process_text_files(config):
     settings = config.get('settings', {})
     text_folder = settings.get('text_files_folder', 'extracted_text_files')
     extraction_rules = config.get('extraction_rules', [])
-    
+
     results = []
     
-    # Get all text files from the specified folder
+    # Get all text files from the specified folder - scandir yields the
+    # file type from the directory read itself, no extra stat per entry
     text_files = []
     if os.path.exists(text_folder):
-        for file in os.listdir(text_folder):
-            if file.endswith('.txt'):
-                text_files.append(os.path.join(text_folder, file))
+        text_files = [entry.path for entry in os.scandir(text_folder)
+                      if entry.is_file() and entry.name.endswith('.txt')]
     
     print(f"Found {len(text_files)} text files to process")
     
-    # Process each text file
-    for file_path in text_files:
-        filename = Path(file_path).stem  # Get filename without extension
-        print(f"Processing: {filename}")
-        
-        # Read the text file
-        text_content = read_text_file(file_path)
-        if not text_content:
-            continue
-        
-        # Apply each extraction rule
-        for rule in extraction_rules:
-            rule_name = rule.get('name', 'unknown')
-            extracted_value = extract_value_strict(text_content, rule)
-            
-            # Always add a result for each rule, whether successful or not
-            if extracted_value:
-                results.append({
-                    'Filename': filename,
-                    'Config_Name': rule_name,
-                    'Extracted_Value': extracted_value
-                })
-                print(f"  ✓ {rule_name}: {extracted_value}")
-            else:
-                results.append({
-                    'Filename': filename,
-                    'Config_Name': rule_name,
-                    'Extracted_Value': 'Not Found'
-                })
-                print(f"  ✗ {rule_name}: Not Found")
-    
+    # Process files in parallel - extraction is CPU-bound string work and
+    # every file is independent. Each worker compiles the rule set once
+    # via the initializer instead of re-pickling patterns per task.
+    with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                             initializer=init_worker,
+                             initargs=(extraction_rules,)) as executor:
+        for index, rows in enumerate(executor.map(process_single_text_file, text_files, chunksize=16), 1):
+            results.extend(rows)
+            # One progress line per 100 files - printing per file (let
+            # alone per rule) serializes workers on stdout and floods the
+            # console on big folders; per-rule detail is in the Excel output
+            if index % 100 == 0 or index == len(text_files):
+                print(f"Processed {index}/{len(text_files)} files...")
+
+    # Fill in the default for missed extractions in one pass instead of a
+    # branch inside the per-rule loop (configurable via settings)
+    default_value = settings.get('default_value', 'Not Found')
+    results = [(filename, rule_name, extracted_value if extracted_value else default_value)
+               for filename, rule_name, extracted_value in results]
+
     return results
 
-def save_to_excel(results, output_file):
+# Control characters that XML 1.0 forbids even when escaped - a single
+# one inside a cell makes Excel refuse to open the workbook
+_XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Fixed parts of a minimal XLSX package; the only part generated per run
+# is the worksheet itself, streamed row by row with inline strings
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+def write_xlsx(output_file, header, rows):
+    """Write a single-sheet XLSX of string cells directly with zipfile.
+
+    The output sheet is uniform inline strings, so emitting the worksheet
+    XML ourselves avoids the per-cell object overhead of a spreadsheet
+    library; rows stream from any iterable with O(1) memory."""
+    with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            for row in itertools.chain([header], rows):
+                cells = ''.join(
+                    f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_ILLEGAL_RE.sub("", str(cell)))}</t></is></c>'
+                    for cell in row
+                )
+                sheet.write(f'<row>{cells}</row>'.encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+
+def save_to_excel(results, output_file, output_format='long', default_value='Not Found'):
     """Save extraction results to Excel file"""
     try:
         # Create output directory if it doesn't exist
@@ -216,28 +384,44 @@ def save_to_excel(results, output_file):
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        # Create DataFrame and save to Excel
-        df = pd.DataFrame(results)
-        df.to_excel(output_file, index=False)
-        
+        filenames = list(dict.fromkeys(filename for filename, _, _ in results))
+        rule_names = list(dict.fromkeys(rule_name for _, rule_name, _ in results))
+
+        # Rows stream straight into the zipped worksheet XML - no
+        # spreadsheet library, no per-cell objects in memory
+        if output_format == 'wide':
+            # One row per file with one column per rule - writes
+            # len(files) rows instead of len(files) x len(rules)
+            values = {(filename, rule_name): extracted_value
+                      for filename, rule_name, extracted_value in results}
+            wide_rows = ([filename] + [values.get((filename, rule_name), default_value)
+                                       for rule_name in rule_names]
+                         for filename in filenames)
+            write_xlsx(output_file, ['Filename'] + rule_names, wide_rows)
+        else:
+            write_xlsx(output_file, ['Filename', 'Config_Name', 'Extracted_Value'], results)
+
         # Print detailed summary
         print(f"\n📊 Extraction Summary:")
-        print(f"Total files processed: {len(df['Filename'].unique())}")
-        print(f"Total extraction rules: {len(df['Config_Name'].unique())}")
-        print(f"Total extraction attempts: {len(df)}")
-        
+        print(f"Total files processed: {len(filenames)}")
+        print(f"Total extraction rules: {len(rule_names)}")
+        print(f"Total extraction attempts: {len(results)}")
+
         # Count successful vs failed extractions
-        successful = len(df[df['Extracted_Value'] != 'Not Found'])
-        failed = len(df[df['Extracted_Value'] == 'Not Found'])
+        successful = sum(1 for _, _, extracted_value in results if extracted_value != default_value)
+        failed = len(results) - successful
         print(f"Successful extractions: {successful}")
         print(f"Failed extractions: {failed}")
-        
+
         # Show breakdown by config name
         print(f"\nBreakdown by extraction rule:")
-        for config_name in df['Config_Name'].unique():
-            config_data = df[df['Config_Name'] == config_name]
-            successful_count = len(config_data[config_data['Extracted_Value'] != 'Not Found'])
-            total_count = len(config_data)
+        for config_name in rule_names:
+            total_count = successful_count = 0
+            for _, rule_name, extracted_value in results:
+                if rule_name == config_name:
+                    total_count += 1
+                    if extracted_value != default_value:
+                        successful_count += 1
             print(f"  {config_name}: {successful_count}/{total_count} successful")
         
         print(f"\n✅ Results saved to: {output_file}")
@@ -262,9 +446,13 @@ def main():
     results = process_text_files(config)
     
     if results:
-        # Save results to Excel
-        output_file = config.get('settings', {}).get('output_excel_file', 'extracted_values.xlsx')
-        save_to_excel(results, output_file)
+        # Save results to Excel ('wide' writes one row per file with a
+        # column per rule instead of one row per file x rule)
+        settings = config.get('settings', {})
+        output_file = settings.get('output_excel_file', 'extracted_values.xlsx')
+        output_format = settings.get('output_format', 'long')
+        default_value = settings.get('default_value', 'Not Found')
+        save_to_excel(results, output_file, output_format, default_value)
     else:
         print("No values were extracted. Please check your configuration and text files.")
 